@@ -1,16 +1,26 @@
 import time
+import asyncio
 import logging
-import math
 import csv
+from collections import defaultdict
 from datetime import datetime
 import numpy as np
 
+# Screen-relative direction -> compass point, per camera bearing.
+BEARING_MAPS = {0:{"Up":"N","Down":"S","Left":"W","Right":"E"}, 90:{"Up":"E","Down":"W","Left":"N","Right":"S"}, 180:{"Up":"S","Down":"N","Left":"E","Right":"W"}, 270:{"Up":"W","Down":"E","Left":"S","Right":"N"}}
+
 class LowPowerStrategy:
-    def __init__(self, camera, model, csv_writer, deployment_info, zone_map):
+    def __init__(self, camera, model, csv_writer, deployment_info, zone_map, frame_queue, cam_executor, frame_writer=None):
         logging.info("Initializing LowPowerStrategy v2.0...")
         self.picam2 = camera
         self.hailo_model = model
         self.csv_writer = csv_writer
+
+        # --- Pipeline plumbing: frames are captured on cam_executor and handed to the inference worker via frame_queue ---
+        self.frame_q = frame_queue
+        self.cam_executor = cam_executor
+        self.lores = True  # Analyze the model-sized lores stream; detections are still scaled to the main stream.
+        self.frame_writer = frame_writer  # Optional shared-memory publisher for the setup server's live view.
         
         # --- Load settings from config file with safe defaults ---
         self.settings = deployment_info.get("detection_settings", {})
@@ -19,40 +29,57 @@ class LowPowerStrategy:
         self.low_speed_kph = self.settings.get("low_speed_kph", 2.0)
         self.shot_interval_sec = self.settings.get("shot_interval_sec", 0.25)
         self.cooldown_config_sec = self.settings.get("cooldown_sec", {"default": 5.0, "person": 5.0, "bicycle": 8.0})
+        # Per-class cooldown with the default pre-resolved, so the hot path is a single lookup.
+        self._default_cooldown = self.cooldown_config_sec.get("default", 5.0)
+        self._cooldown = defaultdict(lambda: self._default_cooldown, self.cooldown_config_sec)
+        self._cooldown.pop("default", None)
 
         self.camera_bearing = int(deployment_info.get("bearing", 0))
+        self._bearing_map = BEARING_MAPS.get(self.camera_bearing, {})
         self.grid_dims = zone_map.get("dims", [32, 18])
+        self.grid_cols, self.grid_rows = self.grid_dims
         self.zone_names = zone_map.get("zones", {})
-        self.zone_map_grid = zone_map.get("map", [])
+        # Zone ids live in a flat int8 grid; zone_name_lut maps an id straight to its name ("unknown" if unnamed).
+        self.zone_arr = np.ascontiguousarray(zone_map.get("map") or [], dtype=np.int8)
+        max_id = max([int(k) for k in self.zone_names] + [int(self.zone_arr.max()) if self.zone_arr.size else 0])
+        self.zone_name_lut = np.array([self.zone_names.get(str(i), "unknown") for i in range(max_id + 1)], dtype=object)
         
+        # --- Main stream geometry is fixed once the camera is configured; resolve it once ---
+        self.cam_w, self.cam_h = camera.camera_configuration()['main']['size']
+        self.capture_shape = (self.cam_h, self.cam_w, 3)
+        self.inv_w = self.grid_cols / self.cam_w
+        self.inv_h = self.grid_rows / self.cam_h
+
         # --- Per-class cooldown timers ---
         self.cooldown_timers = {}
 
-    def _get_location_type(self, x, y):
-        grid_cols, grid_rows = self.grid_dims
-        w, h = self.picam2.camera_configuration()['main']['size']
-        col = int((x / w) * grid_cols)
-        row = int((y / h) * grid_rows)
-        if 0 <= row < grid_rows and 0 <= col < grid_cols:
-            zone_id = str(self.zone_map_grid[row][col])
-            return self.zone_names.get(zone_id, "unknown")
-        return "out_of_bounds"
+        # --- CSV rows written since the last flush; the logger flushes on a row-count/time policy ---
+        self.unflushed_rows = 0
+        self.last_flush = time.monotonic()
 
     def _calculate_direction(self, start_pos, end_pos):
         dx, dy = end_pos['x'] - start_pos['x'], end_pos['y'] - start_pos['y']
         if abs(dx) < 5 and abs(dy) < 5: return "Stationary"
-        angle = math.degrees(math.atan2(dy, dx))
-        if -45 <= angle <= 45: rel = "Right"
-        elif 45 < angle < 135: rel = "Down"
-        elif -135 < angle < -45: rel = "Up"
-        else: rel = "Left"
-        maps = {0:{"Up":"N","Down":"S","Left":"W","Right":"E"}, 90:{"Up":"E","Down":"W","Left":"N","Right":"S"}, 180:{"Up":"S","Down":"N","Left":"E","Right":"W"}, 270:{"Up":"W","Down":"E","Left":"S","Right":"N"}}
-        return maps.get(self.camera_bearing, {}).get(rel, f"Rel_{rel}")
-
-    def _capture_and_analyze(self):
+        # Only the dominant axis matters, so compares are enough; exact diagonals count as Right/Left.
+        if abs(dy) > abs(dx): rel = "Down" if dy > 0 else "Up"
+        else: rel = "Right" if dx > 0 else "Left"
+        return self._bearing_map.get(rel, f"Rel_{rel}")
+
+    async def _capture_frame(self):
+        loop = asyncio.get_running_loop()
+        frame = await loop.run_in_executor(self.cam_executor, self.picam2.capture_array, "lores" if self.lores else "main")
+        if self.frame_writer: self.frame_writer.publish(frame)
+        return frame
+
+    async def _submit(self, frame):
+        """Queues a frame for inference. Returns a future that resolves to its detections."""
+        pending = asyncio.get_running_loop().create_future()
+        await self.frame_q.put((frame, self.capture_shape, time.monotonic(), pending))
+        return pending
+
+    async def _await_detections(self, pending):
         try:
-            image_array = self.picam2.capture_array()
-            detections = self.hailo_model.run_inference(image_array)
+            detections = await pending
             # --- DEBUGGING ENHANCEMENT #3 ---
             logging.info(f"AI analysis complete. Found {len(detections)} detections.")
             return detections
@@ -60,63 +87,93 @@ class LowPowerStrategy:
             logging.error(f"Capture/analysis error: {e}", exc_info=True)
             return []
 
+    async def _capture_and_analyze(self):
+        try:
+            pending = await self._submit(await self._capture_frame())
+        except Exception as e:
+            logging.error(f"Capture/analysis error: {e}", exc_info=True)
+            return []
+        return await self._await_detections(pending)
+
     def _log_all_detections(self, detections, speed_kph, primary_direction="N/A"):
         if not detections: return
         
-        primary_target = next((d for d in detections if d['type'] in self.vehicle_classes), None)
-        if not primary_target:
-            w, h = self.picam2.camera_configuration()['main']['size']
-            primary_target = min(detections, key=lambda d: math.sqrt((d['box_center']['x'] - w/2)**2 + (d['box_center']['y'] - h/2)**2))
-
-        for d in detections:
-            location = self._get_location_type(d['box_center']['x'], d['box_center']['y'])
+        centers = np.fromiter((c for d in detections for c in (d['box_center']['x'], d['box_center']['y'])), dtype=np.float32, count=2 * len(detections)).reshape(-1, 2)
+
+        primary_idx = next((i for i, d in enumerate(detections) if d['type'] in self.vehicle_classes), None)
+        if primary_idx is None:
+            # Closest to the frame centre; squared distance has the same argmin as the true distance.
+            d2 = (centers[:, 0] - self.cam_w / 2) ** 2 + (centers[:, 1] - self.cam_h / 2) ** 2
+            primary_idx = int(d2.argmin())
+
+        # Zone lookup for every detection in one gather; centres outside the grid stay "out_of_bounds".
+        cols = (centers[:, 0] * self.inv_w).astype(np.int32)
+        rows = (centers[:, 1] * self.inv_h).astype(np.int32)
+        in_grid = (cols >= 0) & (cols < self.grid_cols) & (rows >= 0) & (rows < self.grid_rows)
+        locations = np.full(len(detections), "out_of_bounds", dtype=object)
+        locations[in_grid] = self.zone_name_lut[self.zone_arr[rows[in_grid], cols[in_grid]]]
+
+        # Every row from one trigger shares the same capture, so they share one timestamp.
+        ts = datetime.utcnow().isoformat()+"Z"; now = time.monotonic()
+        rows_out = []
+        for i, (d, location) in enumerate(zip(detections, locations)):
             if location == 'ignore':
                 logging.debug(f"Discarding {d['type']} in IGNORE zone.")
                 continue
 
-            speed = speed_kph if d == primary_target else "Associated"
-            direction = primary_direction if d == primary_target else "Associated"
+            speed = speed_kph if i == primary_idx else "Associated"
+            direction = primary_direction if i == primary_idx else "Associated"
             
-            cooldown_period = self.cooldown_config_sec.get(d['type'], self.cooldown_config_sec.get("default", 5.0))
-            self.cooldown_timers[d['type']] = time.monotonic() + cooldown_period
+            self.cooldown_timers[d['type']] = now + self._cooldown[d['type']]
 
-            log_entry = [datetime.utcnow().isoformat()+"Z", d['type'], d['confidence'], speed, direction, location, d['box_center']['x'], d['box_center']['y']]
-            self.csv_writer.writerow(log_entry)
+            log_entry = [ts, d['type'], d['confidence'], speed, direction, location, d['box_center']['x'], d['box_center']['y']]
+            rows_out.append(log_entry)
             logging.info(f"LOGGED: {d['type']} at speed {speed}, dir {direction}")
 
-    def process_radar_trigger(self, radar_data):
+        self.csv_writer.writerows(rows_out)
+        self.unflushed_rows += len(rows_out)
+
+    async def process_radar_trigger(self, radar_data):
         speed_kph = round(radar_data.get('Speed_mps', 0) * 3.6, 2)
         
         logging.debug(f"Radar trigger: {speed_kph} kph")
 
         if speed_kph >= self.vehicle_speed_kph:
-            self._handle_high_speed_event(speed_kph)
+            await self._handle_high_speed_event(speed_kph)
         elif speed_kph >= self.low_speed_kph:
             current_time = time.monotonic()
             if any(current_time >= self.cooldown_timers.get(cls, 0) for cls in ['person', 'bicycle']):
-                 self._handle_low_speed_event(speed_kph)
+                 await self._handle_low_speed_event(speed_kph)
             else:
                 logging.debug("Low-speed event ignored: all relevant classes on cooldown.")
 
-    def _handle_high_speed_event(self, speed_kph):
+    async def _handle_high_speed_event(self, speed_kph):
         logging.info(f"High-speed event ({speed_kph} kph). Two-Shot.")
-        detections1 = self._capture_and_analyze()
-        time.sleep(self.shot_interval_sec)
-        detections2 = self._capture_and_analyze()
+        # Shot 1 is on the NPU while we wait for shot 2. Shot 2 is timed from shot 1's capture, so the
+        # interval between the two frames stays shot_interval_sec however long inference takes.
+        try:
+            frame1 = await self._capture_frame(); shot2_at = time.monotonic() + self.shot_interval_sec
+            pending1 = await self._submit(frame1)
+            await asyncio.sleep(max(0.0, shot2_at - time.monotonic()))
+            pending2 = await self._submit(await self._capture_frame())
+        except Exception as e:
+            logging.error(f"Capture/analysis error: {e}", exc_info=True)
+            return
+        detections1 = await self._await_detections(pending1)
+        detections2 = await self._await_detections(pending2)
 
         direction = "N/A"
         if detections1 and detections2:
-            cam_size = self.picam2.camera_configuration()['main']['size']
-            best1 = self.hailo_model.find_best_detection(detections1, cam_size)
-            best2 = self.hailo_model.find_best_detection(detections2, cam_size)
+            best1 = self.hailo_model.find_best_detection(detections1, self.capture_shape)
+            best2 = self.hailo_model.find_best_detection(detections2, self.capture_shape)
             if best1 and best2 and best1['type'] == best2['type']:
                 direction = self._calculate_direction(best1['box_center'], best2['box_center'])
         
         self._log_all_detections(detections2, speed_kph, direction)
 
-    def _handle_low_speed_event(self, speed_kph):
+    async def _handle_low_speed_event(self, speed_kph):
         logging.info(f"Low-speed event ({speed_kph} kph). Conditional-Shot.")
-        detections = self._capture_and_analyze()
+        detections = await self._capture_and_analyze()
         if not detections: return
 
         current_time = time.monotonic()
@@ -128,12 +185,11 @@ class LowPowerStrategy:
         direction = "N/A"
         if any(d['type'] == 'bicycle' for d in valid_detections):
             logging.info("Bicycle detected, getting second shot for direction.")
-            time.sleep(self.shot_interval_sec)
-            detections2 = self._capture_and_analyze()
+            await asyncio.sleep(self.shot_interval_sec)
+            detections2 = await self._capture_and_analyze()
             if detections2:
-                cam_size = self.picam2.camera_configuration()['main']['size']
-                bike1 = self.hailo_model.find_best_detection([d for d in valid_detections if d['type'] == 'bicycle'], cam_size)
-                bike2 = self.hailo_model.find_best_detection([d for d in detections2 if d['type'] == 'bicycle'], cam_size)
+                bike1 = self.hailo_model.find_best_detection([d for d in valid_detections if d['type'] == 'bicycle'], self.capture_shape)
+                bike2 = self.hailo_model.find_best_detection([d for d in detections2 if d['type'] == 'bicycle'], self.capture_shape)
                 if bike1 and bike2:
                     direction = self._calculate_direction(bike1['box_center'], bike2['box_center'])
                 valid_detections = detections2
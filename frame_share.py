@@ -0,0 +1,69 @@
+import struct
+import sys
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+
+# --- SHARED-MEMORY FRAME HAND-OFF (LOGGER -> SETUP SERVER) ---
+# The logger copies every frame it captures into a named shared-memory block; the setup server maps the
+# same block read-only for its live view, so it never touches the camera or the Hailo.
+# A second 64-byte block holds the header: a sequence number (odd while a frame is being written) and the frame size.
+FRAME_SHM_NAME, HEADER_SHM_NAME = "traffic_frame", "traffic_frame_hdr"
+_HEADER = struct.Struct("<QII")
+
+def _create(name, size):
+    try:
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        # Left behind by a logger that didn't exit cleanly.
+        stale = shared_memory.SharedMemory(name=name); stale.close(); stale.unlink()
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+
+def _attach(name):
+    # Attaching registers the block with this process's resource tracker, which would unlink it on exit.
+    # 3.13+ can opt out up front; older versions have to unregister it afterwards.
+    if sys.version_info >= (3, 13): return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+class FrameWriter:
+    def __init__(self, width, height):
+        self._frame_shm = _create(FRAME_SHM_NAME, width * height * 3)
+        self._header_shm = _create(HEADER_SHM_NAME, 64)
+        self._frame = np.ndarray((height, width, 3), dtype=np.uint8, buffer=self._frame_shm.buf)
+        self._seq, self._width, self._height = 0, width, height
+        _HEADER.pack_into(self._header_shm.buf, 0, self._seq, width, height)
+
+    def publish(self, frame):
+        if frame.shape != self._frame.shape: return
+        self._seq += 1; _HEADER.pack_into(self._header_shm.buf, 0, self._seq, self._width, self._height)
+        self._frame[:] = frame
+        self._seq += 1; _HEADER.pack_into(self._header_shm.buf, 0, self._seq, self._width, self._height)
+
+    def close(self):
+        del self._frame
+        for shm in (self._frame_shm, self._header_shm): shm.close(); shm.unlink()
+
+class FrameReader:
+    """Raises FileNotFoundError if no logger is publishing frames."""
+    def __init__(self):
+        self._header_shm = _attach(HEADER_SHM_NAME)
+        self._frame_shm = _attach(FRAME_SHM_NAME)
+        _, width, height = _HEADER.unpack_from(self._header_shm.buf, 0)
+        self._frame = np.ndarray((height, width, 3), dtype=np.uint8, buffer=self._frame_shm.buf)
+
+    def sequence(self):
+        return _HEADER.unpack_from(self._header_shm.buf, 0)[0]
+
+    def read(self, after=0):
+        """Returns (sequence, view) for a frame newer than `after`, or (after, None). The view is not a copy:
+        check sequence() is unchanged after using it, as the logger may have overwritten it meanwhile."""
+        seq = self.sequence()
+        if seq == after or seq & 1: return after, None
+        return seq, self._frame
+
+    def close(self):
+        del self._frame
+        try: self._frame_shm.close()
+        except BufferError: pass  # A caller still holds a view from read(); the mapping goes when that view does.
+        self._header_shm.close()
@@ -0,0 +1,149 @@
+import os
+import logging
+import queue
+from functools import partial
+import numpy as np
+
+# --- HARDWARE IMPORTS (logger mode only; main.py imports this module lazily) ---
+try:
+    from hailo_platform.pyhailort import pyhailort
+    import cv2
+    AI_ENABLED = True
+except ImportError:
+    pyhailort, cv2 = None, None; AI_ENABLED = False; print("CRITICAL WARNING: Hailo Platform or OpenCV not found.")
+
+try:
+    from postprocess_numba import extract
+    NUMBA_ENABLED = True
+except ImportError:
+    extract = None; NUMBA_ENABLED = False; print("WARNING: Numba not found. Using NumPy postprocessing.")
+
+class InferenceJob:
+    """A frame in flight on the Hailo. result() waits for it, returns its detections and frees its buffer slot."""
+    def __init__(self, model, job, bindings, input_data, slot, original_shape):
+        self._model, self._job, self._bindings, self._slot, self._original_shape = model, job, bindings, slot, original_shape
+        self._input_data = input_data  # Keep the bound input alive until the device is done with it.
+
+    def result(self, timeout_ms=1000):
+        completed = False
+        try:
+            self._job.wait(timeout_ms); completed = True
+            return self._model._postprocess(self._bindings.output().get_buffer(), self._original_shape)
+        finally:
+            # A job that didn't complete may still be writing into its buffers, so its slot gets fresh ones.
+            if self._slot is not None: self._model._release_slot(self._slot, rebuild=not completed); self._slot = None
+
+# --- HAILO MODEL CLASS (DEFINITIVE VERSION) ---
+class HailoModel:
+    CONFIDENCE_THRESHOLD = 0.45
+
+    def __init__(self, hef_path, max_in_flight=2):
+        logging.info(f"Loading Hailo model from {hef_path}")
+        self.is_loaded = False
+        if not AI_ENABLED or not os.path.exists(hef_path):
+            logging.error(f"FATAL: AI libraries missing or HEF file not found at {hef_path}"); return
+
+        try:
+            # 1. A round-robin scheduled VDevice lets the async API queue jobs without per-frame activate().
+            params = pyhailort.VDevice.create_params()
+            params.scheduling_algorithm = pyhailort.HailoSchedulingAlgorithm.ROUND_ROBIN
+            self.target = pyhailort.VDevice(params)
+
+            # 2. Build and configure the InferModel once; it stays configured for the life of the process.
+            self.infer_model = self.target.create_infer_model(hef_path)
+            # Quantized uint8 in (1 byte/px from camera to NPU, no host-side float image), dequantized float32 out.
+            self.infer_model.input().set_format_type(pyhailort.FormatType.UINT8)
+            self.infer_model.output().set_format_type(pyhailort.FormatType.FLOAT32)
+            self._configured = self.infer_model.configure()
+            self.cim = self._configured.__enter__()
+
+            self.input_tensor_shape = tuple(self.infer_model.input().shape)
+            self.output_shape = tuple(self.infer_model.output().shape)
+
+            # One input/output buffer pair per in-flight frame, reused for every job instead of allocated per frame.
+            # A slot is taken on submit and handed back once the job's result has been read.
+            self._in_bufs = [np.empty(self.input_tensor_shape, dtype=np.uint8) for _ in range(max_in_flight)]
+            self._out_bufs = [np.empty(self.output_shape, dtype=np.float32) for _ in range(max_in_flight)]
+            self._free_slots = queue.Queue()
+            for slot in range(max_in_flight): self._free_slots.put(slot)
+
+            self.class_names = self._load_class_names()
+            # Compile (or load from the on-disk cache) now so the first real frame doesn't pay for it.
+            if NUMBA_ENABLED: extract(np.zeros((1, self.output_shape[-1]), dtype=np.float32), self.CONFIDENCE_THRESHOLD, 1, 1)
+            self.is_loaded = True
+            logging.info("Hailo model loaded and configured successfully.")
+        except Exception as e:
+            logging.error(f"FATAL: Failed during Hailo model initialization: {e}", exc_info=True); self.is_loaded = False
+
+    def close(self):
+        if getattr(self, '_configured', None): self._configured.__exit__(None, None, None); self._configured = None
+        if getattr(self, 'target', None): self.target.release(); self.target = None
+
+    def _load_class_names(self):
+        with open("coco_labels.txt", "r") as f: return [line.strip() for line in f.readlines()]
+
+    def _preprocess(self, image_np, in_buf):
+        # The input stream is UINT8; a frame of any other dtype would be misread byte-for-byte, not converted.
+        if image_np.dtype != np.uint8: raise TypeError(f"Expected a uint8 frame, got {image_np.dtype}.")
+        height, width, _ = self.input_tensor_shape
+        # Frames from the lores stream are already scaled by the ISP to the model's input size.
+        if image_np.shape[:2] == (height, width): return np.ascontiguousarray(image_np)
+        return cv2.resize(image_np, (width, height), dst=in_buf, interpolation=cv2.INTER_LINEAR)
+
+    def _postprocess(self, raw_results, original_shape):
+        original_height, original_width, _ = original_shape
+        # The result is a raw (N, 5 + classes) array; threshold and argmax it in one pass rather than row by row.
+        raw = np.asarray(raw_results, dtype=np.float32)
+        raw = np.ascontiguousarray(raw.reshape(-1, raw.shape[-1]))
+        if NUMBA_ENABLED:
+            xs, ys, confidences, class_ids = extract(raw, self.CONFIDENCE_THRESHOLD, original_width, original_height)
+        else:
+            sub = raw[raw[:, 4] > self.CONFIDENCE_THRESHOLD]
+            class_ids = sub[:, 5:].argmax(axis=1)
+            xs = (sub[:, 0] * original_width).astype(np.int32)
+            ys = (sub[:, 1] * original_height).astype(np.int32)
+            confidences = sub[:, 4]
+        confidences = np.round(confidences.astype(np.float64), 2)
+        return [{"type": self.class_names[class_id], "confidence": confidence, "box_center": {"x": x, "y": y}}
+                for class_id, confidence, x, y in zip(class_ids.tolist(), confidences.tolist(), xs.tolist(), ys.tolist())]
+
+    def _release_slot(self, slot, rebuild=False):
+        if rebuild:
+            self._in_bufs[slot] = np.empty(self.input_tensor_shape, dtype=np.uint8)
+            self._out_bufs[slot] = np.empty(self.output_shape, dtype=np.float32)
+        self._free_slots.put(slot)
+
+    def _on_done(self, completion_info, buffers=None):
+        # buffers is unused: holding it here keeps a job's input/output arrays alive until the device is done with them.
+        if completion_info.exception: logging.error(f"Hailo async inference failed: {completion_info.exception}")
+
+    def run_inference_async(self, image_np, original_shape=None):
+        """Submits one frame and returns an InferenceJob without waiting for the device. Blocks only while
+        every buffer slot is in flight. Detections are scaled to original_shape (default: the frame's own shape)."""
+        if not self.is_loaded: raise RuntimeError("Hailo model is not loaded.")
+        slot = self._free_slots.get()
+        try:
+            # 3. Bind this frame's buffers and submit; the device scheduler overlaps it with any job already in flight.
+            input_data = self._preprocess(image_np, self._in_bufs[slot])
+            bindings = self.cim.create_bindings()
+            bindings.input().set_buffer(input_data)
+            bindings.output().set_buffer(self._out_bufs[slot])
+            self.cim.wait_for_async_ready(timeout_ms=1000)
+            job = self.cim.run_async([bindings], partial(self._on_done, buffers=(input_data, self._out_bufs[slot])))
+        except Exception:
+            self._free_slots.put(slot); raise
+        return InferenceJob(self, job, bindings, input_data, slot, original_shape or image_np.shape)
+
+    def run_inference(self, image_np, original_shape=None):
+        if not self.is_loaded: return []
+        try:
+            return self.run_inference_async(image_np, original_shape).result()
+        except Exception as e:
+            logging.error(f"Error during Hailo inference: {e}", exc_info=True); return []
+
+    def find_best_detection(self, detections, capture_shape, strategy='center'):
+        if not detections: return None
+        if strategy == 'confidence': return max(detections, key=lambda d: d['confidence'])
+        cx, cy = capture_shape[1] / 2, capture_shape[0] / 2
+        # Squared distance picks the same detection as the true distance without the sqrt.
+        return min(detections, key=lambda d: (d['box_center']['x'] - cx) * (d['box_center']['x'] - cx) + (d['box_center']['y'] - cy) * (d['box_center']['y'] - cy))
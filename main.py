@@ -1,125 +1,27 @@
 import os
-import sys
 import json
 import logging
 import csv
 import time
-import math
 from datetime import datetime
 import subprocess
 import io
 import argparse
-import numpy as np
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import signal
-
-# --- OUR NEW LOGIC MODULE ---
-from detection_logic import LowPowerStrategy
-
-# --- HARDWARE IMPORTS ---
-try:
-    from flask import Flask, render_template, Response, request, jsonify
-    FLASK_ENABLED = True
-except ImportError:
-    Flask, render_template, Response, request, jsonify = None, None, None, None, None; FLASK_ENABLED = False; print("CRITICAL WARNING: Flask not found.")
-
-try:
-    from picamera2 import Picamera2
-    CAMERA_ENABLED = True
-except ImportError:
-    Picamera2 = None; CAMERA_ENABLED = False; print("CRITICAL WARNING: Picamera2 not found.")
-
-try:
-    from hailo_platform.pyhailort import pyhailort
-    import cv2
-    AI_ENABLED = True
-except ImportError:
-    pyhailort, cv2 = None, None; AI_ENABLED = False; print("CRITICAL WARNING: Hailo Platform or OpenCV not found.")
-
-try:
-    import serial
-    RADAR_ENABLED = True
-except ImportError:
-    serial = None; RADAR_ENABLED = False; print("CRITICAL WARNING: PySerial not found.")
+import threading
+import atexit
 
 logging.getLogger("picamera2").setLevel(logging.WARNING)
 
-# --- HAILO MODEL CLASS (DEFINITIVE VERSION) ---
-class HailoModel:
-    def __init__(self, hef_path):
-        logging.info(f"Loading Hailo model from {hef_path}")
-        self.is_loaded = False
-        if not AI_ENABLED or not os.path.exists(hef_path):
-            logging.error(f"FATAL: AI libraries missing or HEF file not found at {hef_path}"); return
-
-        try:
-            hef = pyhailort.HEF(hef_path)
-            self.target = pyhailort.VDevice()
-            
-            # 1. Configure the HEF on the target to get the network group(s).
-            configured_networks = self.target.configure(hef)
-            if not configured_networks:
-                raise RuntimeError("Failed to configure the HEF on the VDevice.")
-            self.network_group = configured_networks[0]
-            
-            # 2. Get stream info from the network group itself BEFORE activation.
-            self.input_vstream_infos = self.network_group.get_input_vstream_infos()
-            if not self.input_vstream_infos:
-                raise RuntimeError("No input vstreams found.")
-            self.input_tensor_shape = self.input_vstream_infos[0].shape
-            
-            self.class_names = self._load_class_names()
-            self.is_loaded = True
-            logging.info("Hailo model loaded and configured successfully.")
-        except Exception as e:
-            logging.error(f"FATAL: Failed during Hailo model initialization: {e}", exc_info=True); self.is_loaded = False
-
-    def _load_class_names(self):
-        with open("coco_labels.txt", "r") as f: return [line.strip() for line in f.readlines()]
-
-    def _preprocess(self, image_np):
-        height, width, _ = self.input_tensor_shape
-        return cv2.resize(image_np, (width, height), interpolation=cv2.INTER_LINEAR)
-
-    def _postprocess(self, raw_results, original_shape):
-        detections = []
-        original_height, original_width, _ = original_shape
-        # The result from read() is a raw numpy array.
-        for box in raw_results:
-            confidence = box[4]
-            if confidence > 0.45:
-                class_id = np.argmax(box[5:])
-                detections.append({
-                    "type": self.class_names[class_id],
-                    "confidence": round(float(confidence), 2),
-                    "box_center": {"x": int(box[0] * original_width), "y": int(box[1] * original_height)}
-                })
-        return detections
-
-    def run_inference(self, image_np):
-        if not self.is_loaded: return []
-        try:
-            input_data = self._preprocess(image_np)
-            # 3. The correct way to run inference is with the activate() context manager.
-            with self.network_group.activate() as activated_network:
-                # 4. The activated_network yields the streams for this run.
-                activated_network.get_input_vstreams()[0].write(input_data)
-                raw_results_nd_array = activated_network.get_output_vstreams()[0].read()
-
-            return self._postprocess(raw_results_nd_array, image_np.shape)
-        except Exception as e:
-            logging.error(f"Error during Hailo inference: {e}", exc_info=True); return []
-
-    def find_best_detection(self, detections, capture_shape, strategy='center'):
-        if not detections: return None
-        if strategy == 'confidence': return max(detections, key=lambda d: d['confidence'])
-        cx, cy = capture_shape[1] / 2, capture_shape[0] / 2
-        return min(detections, key=lambda d: math.sqrt((d['box_center']['x'] - cx)**2 + (d['box_center']['y'] - cy)**2))
-
 # --- Global Configuration & State ---
 STATIC_MOUNT_POINT = "/media/usb_data_drive"; STATE_FILE = "/tmp/traffic_state.json"; GRID_COLS, GRID_ROWS = 32, 18
 LOGGER_CAPTURE_WIDTH, LOGGER_CAPTURE_HEIGHT = 1536, 864
+RADAR_QUEUE_SIZE, FRAME_QUEUE_SIZE = 2, 2
+USB_CACHE_TTL_SEC = 30
+CSV_FLUSH_ROWS, CSV_FLUSH_INTERVAL_SEC = 16, 2.0
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-app = Flask(__name__, template_folder='templates') if FLASK_ENABLED else None
 
 # --- Core System Functions (Unchanged) ---
 def verify_usb_drive():
@@ -138,30 +40,188 @@ def verify_usb_drive():
         logging.info("Successfully mounted USB drive."); return STATIC_MOUNT_POINT
     except Exception as e: logging.error(f"USB mount error: {e}", exc_info=True); return None
 
-def run_logger_process(deployment_folder):
+# The setup server keeps one camera running for its lifetime instead of paying a 2 s start per request.
+_server_cam = None; _server_cam_lock = threading.Lock()
+
+def get_server_camera():
+    """Starts the shared setup-server camera on first use. Callers must hold _server_cam_lock."""
+    global _server_cam
+    if _server_cam is None:
+        from picamera2 import Picamera2
+        cam = Picamera2()
+        try:
+            config = cam.create_still_configuration(main={"size": (LOGGER_CAPTURE_WIDTH, LOGGER_CAPTURE_HEIGHT)}); cam.configure(config); cam.start(); time.sleep(2)
+        except Exception:
+            cam.close(); raise
+        atexit.register(cam.close)
+        _server_cam = cam
+    return _server_cam
+
+# The setup page shows the latest deployment folder; re-check the drive (and maybe mount it) at most every USB_CACHE_TTL_SEC.
+_usb_cache = {'ts': None, 'path': None, 'latest': ''}
+
+def _cached_drive():
+    now = time.monotonic()
+    if _usb_cache['ts'] is None or now - _usb_cache['ts'] > USB_CACHE_TTL_SEC:
+        latest_folder = ""; drive_path = verify_usb_drive()
+        if drive_path:
+            try:
+                with os.scandir(drive_path) as entries:
+                    folders = [(entry.stat().st_mtime, entry.path) for entry in entries if entry.is_dir()]
+                if folders: latest_folder = max(folders)[1]
+            except Exception as e: logging.error(f"Could not scan folders: {e}")
+        _usb_cache.update(ts=now, path=drive_path, latest=latest_folder)
+    return _usb_cache['path'], _usb_cache['latest']
+
+async def open_radar():
+    import serial_asyncio
+    reader, writer = await serial_asyncio.open_serial_connection(url='/dev/ttyACM0', baudrate=9600); await asyncio.sleep(1)
+    logging.info("Sending radar configuration commands...")
+    writer.write(b'O1\r\n'); await writer.drain(); await asyncio.sleep(0.1)
+    writer.write(b'S9\r\n'); await writer.drain(); await asyncio.sleep(0.1)
+    writer.write(b'OU\r\n'); await writer.drain(); await asyncio.sleep(0.1)
+    return reader, writer
+
+def close_radar(writer):
+    if writer.is_closing(): return
+    logging.info("Sending command to turn off radar transmitter.")
+    writer.write(b'o0\r\n')
+    writer.close()
+
+# --- Logger Pipeline: radar reader -> capture worker -> inference worker ---
+async def radar_reader(radar, radar_q):
+    """Owns the radar port: parses speeds into radar_q, dropping the oldest reading when the capture side lags."""
+    import serial
+    # Faster JSON decoding for radar packets when available; both raise ValueError subclasses on bad input.
+    try:
+        from orjson import loads as json_loads
+    except ImportError:
+        try: from ujson import loads as json_loads
+        except ImportError: json_loads = json.loads
+    reader, writer = radar
+    try:
+        while True:
+            line = ""
+            try:
+                # The event loop sleeps in the fd poll until a chunk arrives; lines are split out of the stream buffer.
+                line = (await reader.readuntil(b'\n')).decode('utf-8').strip()
+                if line:
+                    logging.debug(f"Raw radar line: {line}")
+                    speed_mps = None
+                    if line.startswith('"mps"'):
+                        # Common case, e.g. "mps",1.23 - parse the number after the comma without a split().
+                        i = line.rfind(',')
+                        if i > 0: speed_mps = float(line[i + 1:])
+                    elif line.startswith('{') and line.endswith('}'):
+                        data = json_loads(line)
+                        if 'speed' in data: speed_mps = float(data['speed'])
+                    elif '"mps"' in line:
+                        parts = line.split(',');
+                        if len(parts) == 2: speed_mps = float(parts[1])
+
+                    if speed_mps is not None:
+                        if radar_q.full(): radar_q.get_nowait()
+                        radar_q.put_nowait(speed_mps)
+            except (serial.SerialException, asyncio.IncompleteReadError, ConnectionError) as e:
+                logging.error(f"Radar serial error: {e}. Re-initializing...", exc_info=True)
+                writer.close(); await asyncio.sleep(5)
+                try:
+                    logging.info("Re-opening radar port.")
+                    reader, writer = await open_radar()
+                except Exception as reinit_e:
+                    logging.error(f"Failed to re-initialize radar: {reinit_e}. Retrying..."); await asyncio.sleep(10)
+            except asyncio.LimitOverrunError as e:
+                # No newline within the stream limit (line noise, misconfigured radar). The bytes stay buffered,
+                # so drop them or readuntil() would fail on them again forever.
+                logging.warning(f"Radar line too long, discarding {e.consumed} bytes.")
+                await reader.read(e.consumed)
+            except (json.JSONDecodeError, ValueError, IndexError, KeyError) as parse_e:
+                logging.warning(f"Could not process radar line: '{line}'. Error: {parse_e}")
+            except Exception as loop_e:
+                logging.error(f"Unhandled exception in radar reader: {loop_e}", exc_info=True)
+    finally:
+        close_radar(writer)
+
+def flush_csv_if_due(strategy, csv_file_handle):
+    """Flushes pending rows once there are CSV_FLUSH_ROWS of them or CSV_FLUSH_INTERVAL_SEC has passed since the last flush."""
+    if not strategy.unflushed_rows: return
+    now = time.monotonic()
+    if strategy.unflushed_rows >= CSV_FLUSH_ROWS or now - strategy.last_flush > CSV_FLUSH_INTERVAL_SEC:
+        csv_file_handle.flush(); strategy.unflushed_rows = 0; strategy.last_flush = now
+
+async def capture_worker(strategy, radar_q, csv_file_handle):
+    """Pulls speeds off radar_q and lets the strategy decide what to shoot; frames go on to the inference worker."""
+    while True:
+        try:
+            speed_mps = await asyncio.wait_for(radar_q.get(), timeout=CSV_FLUSH_INTERVAL_SEC)
+        except asyncio.TimeoutError:
+            flush_csv_if_due(strategy, csv_file_handle); continue
+        try:
+            radar_data_to_process = {'Speed_mps': speed_mps}
+            await strategy.process_radar_trigger(radar_data_to_process)
+            flush_csv_if_due(strategy, csv_file_handle)
+        except Exception as loop_e:
+            logging.error(f"Unhandled exception in capture worker: {loop_e}", exc_info=True)
+
+async def collect_inference(job, t_capture, pending):
+    try:
+        detections = await asyncio.get_running_loop().run_in_executor(None, job.result)
+        logging.debug(f"Inference finished {(time.monotonic() - t_capture) * 1000:.0f} ms after capture.")
+        if not pending.done(): pending.set_result(detections)
+    except Exception as e:
+        if not pending.done(): pending.set_exception(e)
+
+async def inference_worker(hailo_model, frame_q, hailo_executor):
+    """Submits queued frames to the Hailo from its own single thread (vstreams are not thread-safe). Results are
+    collected in the background, so the next frame can be submitted while the NPU is still busy with the last."""
+    loop = asyncio.get_running_loop()
+    collecting = set()
+    try:
+        while True:
+            frame, capture_shape, t_capture, pending = await frame_q.get()
+            try:
+                job = await loop.run_in_executor(hailo_executor, hailo_model.run_inference_async, frame, capture_shape)
+            except Exception as e:
+                if not pending.done(): pending.set_exception(e)
+                continue
+            task = asyncio.create_task(collect_inference(job, t_capture, pending))
+            collecting.add(task); task.add_done_callback(collecting.discard)
+    finally:
+        # Cancelling a collect task would not stop its executor thread, which may still be reading the device's
+        # buffers; let in-flight jobs finish (job.wait has a timeout) before the caller closes the model.
+        if collecting: await asyncio.gather(*collecting, return_exceptions=True)
+
+async def run_logger_process(deployment_folder):
     log_file_path = os.path.join(deployment_folder, "debug.log")
     file_handler = logging.FileHandler(log_file_path)
     file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')); file_handler.setLevel(logging.DEBUG)
     logging.getLogger().addHandler(file_handler)
     logging.info(f"--- LOGGER MODE: LOGGING TO {log_file_path} ---")
 
-    picam2_logger, radar_serial, csv_file_handle = None, None, None
+    picam2_logger, frame_writer, radar, hailo_model, csv_file_handle, tasks = None, None, None, None, None, []
+    cam_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='camera')
+    hailo_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='hailo')
     try:
+        # Logger-only dependencies are imported here so server mode never pays for them.
+        from picamera2 import Picamera2
+        from hailo_model import HailoModel
+        from detection_logic import LowPowerStrategy
+        from frame_share import FrameWriter
+
         with open(os.path.join(deployment_folder, 'deployment_info.json'), 'r') as f: deployment_info = json.load(f)
         with open(os.path.join(deployment_folder, 'zone_map.json'), 'r') as f: zone_map = json.load(f)
         logging.info("Configuration files loaded successfully.")
 
         logging.info("Initializing hardware...")
-        picam2_logger = Picamera2(); config = picam2_logger.create_still_configuration(main={"size": (LOGGER_CAPTURE_WIDTH, LOGGER_CAPTURE_HEIGHT)}, controls={"FrameDurationLimits": (10000, 10000)}); picam2_logger.configure(config); picam2_logger.start(); time.sleep(2)
-        
-        radar_serial = serial.Serial(port='/dev/ttyACM0', baudrate=9600, timeout=1); time.sleep(1)
-        logging.info("Sending radar configuration commands...")
-        radar_serial.write(b'O1\r\n'); time.sleep(0.1)
-        radar_serial.write(b'S9\r\n'); time.sleep(0.1)
-        radar_serial.write(b'OU\r\n'); time.sleep(0.1)
-
         hailo_model = HailoModel('yolov8s.hef')
         if not hailo_model.is_loaded: raise RuntimeError("AI Model failed to load.")
+
+        # The lores stream is scaled to the model input by the ISP (same RGB pixel order as the main still stream); main stays full-res.
+        model_h, model_w, _ = hailo_model.input_tensor_shape
+        picam2_logger = Picamera2(); config = picam2_logger.create_still_configuration(main={"size": (LOGGER_CAPTURE_WIDTH, LOGGER_CAPTURE_HEIGHT)}, lores={"size": (model_w, model_h), "format": "BGR888"}, controls={"FrameDurationLimits": (10000, 10000)}); picam2_logger.configure(config); picam2_logger.start(); time.sleep(2)
+        frame_writer = FrameWriter(model_w, model_h)
+
+        radar = await open_radar()
         logging.info("All hardware initialized successfully.")
 
         csv_path = os.path.join(deployment_folder, "traffic_data.csv")
@@ -170,57 +230,75 @@ def run_logger_process(deployment_folder):
             csv_writer.writerow(['timestamp_utc', 'object_type', 'confidence', 'speed_kph', 'cardinal_direction', 'location_type', 'obj_center_x', 'obj_center_y']); csv_file_handle.flush()
         logging.info("CSV writer ready.")
 
-        strategy = LowPowerStrategy(picam2_logger, hailo_model, csv_writer, deployment_info, zone_map)
+        radar_q = asyncio.Queue(maxsize=RADAR_QUEUE_SIZE); frame_q = asyncio.Queue(maxsize=FRAME_QUEUE_SIZE)
+        strategy = LowPowerStrategy(picam2_logger, hailo_model, csv_writer, deployment_info, zone_map, frame_q, cam_executor, frame_writer)
         logging.info("--- Starting Main Logging Loop ---")
-        
-        while True:
-            line = ""
-            try:
-                line = radar_serial.readline().decode('utf-8').strip()
-                if line:
-                    logging.debug(f"Raw radar line: {line}")
-                    speed_mps = None
-                    if line.startswith('{') and line.endswith('}'):
-                        data = json.loads(line)
-                        if 'speed' in data: speed_mps = float(data['speed'])
-                    elif '"mps"' in line:
-                        parts = line.split(',');
-                        if len(parts) == 2: speed_mps = float(parts[1])
 
-                    if speed_mps is not None:
-                        radar_data_to_process = {'Speed_mps': speed_mps}
-                        strategy.process_radar_trigger(radar_data_to_process)
-                        csv_file_handle.flush()
-            except serial.SerialException as e:
-                logging.error(f"Radar serial error: {e}. Re-initializing...", exc_info=True)
-                if radar_serial: radar_serial.close(); time.sleep(5)
-                try:
-                    radar_serial = serial.Serial(port='/dev/ttyACM0', baudrate=9600, timeout=1)
-                    logging.info("Re-sending radar configuration commands..."); 
-                    radar_serial.write(b'O1\r\n'); time.sleep(0.1)
-                    radar_serial.write(b'S9\r\n'); time.sleep(0.1)
-                    radar_serial.write(b'OU\r\n'); time.sleep(0.1)
-                except Exception as reinit_e:
-                    logging.error(f"Failed to re-initialize radar: {reinit_e}. Retrying..."); time.sleep(10)
-            except (json.JSONDecodeError, ValueError, IndexError, KeyError) as parse_e:
-                logging.warning(f"Could not process radar line: '{line}'. Error: {parse_e}")
-            except Exception as loop_e:
-                logging.error(f"Unhandled exception in main loop: {loop_e}", exc_info=True)
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        tasks = [asyncio.create_task(radar_reader(radar, radar_q)),
+                 asyncio.create_task(capture_worker(strategy, radar_q, csv_file_handle)),
+                 asyncio.create_task(inference_worker(hailo_model, frame_q, hailo_executor))]
+        radar = None  # The radar reader owns the port from here on.
+        await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        logging.info("Logger cancelled, shutting down.")
     except Exception as e: 
         logging.error(f"FATAL error in logger setup: {e}", exc_info=True)
     finally:
         logging.info("Closing resources.");
-        if radar_serial:
-             logging.info("Sending command to turn off radar transmitter.")
-             radar_serial.write(b'o0\r\n')
-             radar_serial.close()
+        for task in tasks: task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if radar: close_radar(radar[1])
+        cam_executor.shutdown(wait=True); hailo_executor.shutdown(wait=True)
+        if hailo_model: hailo_model.close()
+        if frame_writer: frame_writer.close()
         if picam2_logger: picam2_logger.stop()
         if csv_file_handle: csv_file_handle.close()
         logging.getLogger().removeHandler(file_handler)
 
-# --- Flask and Main Entry Point (Unchanged) ---
-if app:
-    # ... (Flask code is unchanged) ...
+# --- Flask and Main Entry Point ---
+def create_app(live_only=False):
+    """Builds the setup server. gunicorn calls this as main:create_app(), so logger mode never imports Flask.
+    With live_only=True (beside a running logger) only the live view is served: the logger owns the camera."""
+    from flask import Flask, render_template, Response, request, jsonify, redirect
+    from frame_share import FrameReader
+    try:
+        from turbojpeg import TurboJPEG, TJPF_RGB
+        jpeg_encoder = TurboJPEG()
+        TURBOJPEG_ENABLED = True
+    except Exception:
+        jpeg_encoder, TJPF_RGB = None, None; TURBOJPEG_ENABLED = False; print("WARNING: TurboJPEG not found. Using libcamera's JPEG encoder.")
+
+    app = Flask(__name__, template_folder='templates')
+
+    @app.route('/live.mjpg')
+    def live_mjpg():
+        # Frames come from the logger process via shared memory; the server never opens the camera for this.
+        if not TURBOJPEG_ENABLED: return "Error: TurboJPEG is required for the live view.", 500
+        try: reader = FrameReader()
+        except FileNotFoundError: return "Error: Logger is not running.", 404
+
+        def stream():
+            seq, frame = 0, None
+            try:
+                while True:
+                    new_seq, frame = reader.read(seq)
+                    if frame is None: time.sleep(0.05); continue
+                    jpeg = jpeg_encoder.encode(frame, quality=85, pixel_format=TJPF_RGB)
+                    if reader.sequence() != new_seq: continue  # Overwritten mid-encode; take the next one.
+                    seq = new_seq
+                    yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n'
+            finally:
+                frame = None  # Drop our view of the shared block so it can be closed.
+                reader.close()
+        return Response(stream(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+    if live_only:
+        @app.route('/')
+        def index_live():
+            return redirect('/live.mjpg')
+        return app
+
     @app.route('/save_settings', methods=['POST'])
     def save_settings():
         drive_path = verify_usb_drive()
@@ -233,9 +311,9 @@ if app:
             with open(os.path.join(folder, 'deployment_info.json'), 'w') as f: json.dump(info, f, indent=4)
             z_map = {"dims": [GRID_COLS, GRID_ROWS], "zones": {"0":"ignore", "1":"road", "2":"sidewalk", "3":"bike_lane"}, "map": data.get('mask')}
             with open(os.path.join(folder, 'zone_map.json'), 'w') as f: json.dump(z_map, f, indent=4)
-            with Picamera2() as cam:
-                config = cam.create_still_configuration(main={"size": (LOGGER_CAPTURE_WIDTH, LOGGER_CAPTURE_HEIGHT)}); cam.configure(config); cam.start(); time.sleep(2)
-                cam.capture_file(os.path.join(folder, 'reference_photo.jpg'))
+            with _server_cam_lock:
+                get_server_camera().capture_file(os.path.join(folder, 'reference_photo.jpg'))
+            _usb_cache['ts'] = None  # The new folder is now the latest one.
             logging.info(f"Saved new deployment: {ts}")
             return jsonify(success=True, message=f"Settings saved to: {ts}", new_folder=folder)
         except Exception as e:
@@ -244,22 +322,18 @@ if app:
     # ... (the rest of the Flask code is identical)
     @app.route('/')
     def index():
-        latest_folder = ""; drive_path = verify_usb_drive()
-        if drive_path:
-            try:
-                folders = [os.path.join(drive_path, d) for d in os.listdir(drive_path) if os.path.isdir(os.path.join(drive_path, d))]
-                if folders: latest_folder = max(folders, key=os.path.getmtime)
-            except Exception as e: logging.error(f"Could not scan folders: {e}")
+        _, latest_folder = _cached_drive()
         return render_template('index.html', grid_cols=GRID_COLS, grid_rows=GRID_ROWS, latest_deployment_folder=latest_folder)
         
     @app.route('/capture_photo')
     def capture_photo():
-        if not CAMERA_ENABLED: return "Error: Camera disabled.", 500
         try:
-            with Picamera2() as camera:
-                config = camera.create_still_configuration(main={"size": (LOGGER_CAPTURE_WIDTH, LOGGER_CAPTURE_HEIGHT)}); camera.configure(config); camera.start(); time.sleep(2)
+            with _server_cam_lock:
+                camera = get_server_camera()
+                # The still stream's BGR888 format is laid out R, G, B in memory.
+                if TURBOJPEG_ENABLED: return Response(jpeg_encoder.encode(camera.capture_array(), quality=85, pixel_format=TJPF_RGB), mimetype='image/jpeg')
                 buffer = io.BytesIO(); camera.capture_file(buffer, format='jpeg'); buffer.seek(0)
-                return Response(buffer, mimetype='image/jpeg')
+            return Response(buffer, mimetype='image/jpeg')
         except Exception as e:
             logging.error(f"Photo capture error: {e}", exc_info=True); return "Error capturing photo.", 500
     
@@ -286,12 +360,15 @@ if app:
         except Exception as e:
             logging.error(f"State file error: {e}", exc_info=True); return jsonify(success=False, message=str(e)), 500
 
+    return app
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(); parser.add_argument('--mode', type=str, choices=['server', 'logger'], required=True); parser.add_argument('--folder', type=str)
     args = parser.parse_args()
     if args.mode == 'server':
-        if app: app.run(host='0.0.0.0', port=5000)
-        else: print("ERROR: Flask not enabled.")
+        try: app = create_app()
+        except ImportError as e: print(f"ERROR: Flask not enabled. {e}")
+        else: app.run(host='0.0.0.0', port=5000)
     elif args.mode == 'logger':
         if not args.folder or not os.path.isdir(args.folder): print(f"ERROR: --folder is required. Got: {args.folder}")
-        else: run_logger_process(args.folder)
\ No newline at end of file
+        else: asyncio.run(run_logger_process(args.folder))
\ No newline at end of file
@@ -0,0 +1,22 @@
+import numpy as np
+from numba import njit
+
+# --- JIT-COMPILED YOLO POSTPROCESS KERNEL ---
+# One fused pass over the raw (N, 5 + classes) head output: confidence threshold, class argmax
+# and centre scaling, with no intermediate mask or class-slice copies. Compiled code is cached on disk.
+@njit(cache=True, fastmath=True, boundscheck=False)
+def extract(raw, thr, W, H):
+    n, width = raw.shape
+    xs = np.empty(n, dtype=np.int32); ys = np.empty(n, dtype=np.int32)
+    confs = np.empty(n, dtype=np.float32); class_ids = np.empty(n, dtype=np.int32)
+    k = 0
+    for i in range(n):
+        conf = raw[i, 4]
+        if conf <= thr: continue
+        best_j, best_v = 5, raw[i, 5]
+        for j in range(6, width):
+            if raw[i, j] > best_v: best_j, best_v = j, raw[i, j]
+        xs[k] = np.int32(raw[i, 0] * W); ys[k] = np.int32(raw[i, 1] * H)
+        confs[k] = conf; class_ids[k] = best_j - 5
+        k += 1
+    return xs[:k], ys[:k], confs[:k], class_ids[:k]
@@ -28,20 +28,34 @@ if [ -f "$STATE_FILE" ]; then
         # CRITICAL: Remove the state file NOW so the next reboot defaults to server mode.
         rm "$STATE_FILE"
 
+        # Clear frame blocks a crashed logger may have left, so the wait below only sees the new one.
+        rm -f /dev/shm/traffic_frame /dev/shm/traffic_frame_hdr
+
         # Launch the python logger script directly, passing the folder as an argument.
         # Using absolute paths for maximum reliability in the systemd environment.
-        /usr/bin/python3 /home/traffic/traffic/main.py --mode logger --folder "$FOLDER_PATH"
+        /usr/bin/python3 /home/traffic/traffic/main.py --mode logger --folder "$FOLDER_PATH" &
+        LOGGER_PID=$!
+        trap 'kill $SERVER_PID 2>/dev/null' EXIT
+
+        # Start a live-view-only web server beside the logger, so /live.mjpg can show the logger's frames
+        # (shared memory). Wait until the logger holds the camera: its frame block appears right after that.
+        while kill -0 $LOGGER_PID 2>/dev/null && [ ! -e /dev/shm/traffic_frame_hdr ]; do sleep 1; done
+        if kill -0 $LOGGER_PID 2>/dev/null; then
+            /usr/bin/gunicorn --workers 1 --threads 4 --bind 0.0.0.0:5000 --timeout 120 'main:create_app(live_only=True)' &
+            SERVER_PID=$!
+        fi
+        wait $LOGGER_PID
 
     else
         # The folder specified in the state file is invalid. This is an error condition.
         echo "ERROR: Folder '$FOLDER_PATH' from state file does not exist. Aborting logger."
         echo "Removing invalid state file and defaulting to Setup Server Mode."
         rm "$STATE_FILE"
-        /usr/bin/gunicorn --workers 1 --bind 0.0.0.0:5000 --timeout 120 main:app
+        /usr/bin/gunicorn --workers 1 --threads 4 --bind 0.0.0.0:5000 --timeout 120 'main:create_app()'
     fi
 
 else
     # STATE FILE DOES NOT EXIST: This is the default case. Start the setup server.
     echo "No state file found. Starting Setup Server Mode."
-    /usr/bin/gunicorn --workers 1 --bind 0.0.0.0:5000 --timeout 120 main:app
+    /usr/bin/gunicorn --workers 1 --threads 4 --bind 0.0.0.0:5000 --timeout 120 'main:create_app()'
 fi
\ No newline at end of file